@@ -0,0 +1,339 @@
+import os
+import re
+import math
+import fnmatch
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+
+# Files larger than this are never chunked unless the caller raises the cap
+DEFAULT_MAX_FILE_SIZE = 256 * 1024
+
+# Directories that are pruned from the walk entirely
+IGNORED_DIRECTORIES = {
+    'node_modules', 'venv', '__pycache__', 'build', 'dist',
+    'vendor', 'third_party', 'bower_components'
+}
+
+# Lockfiles and other machine-written files identified by name
+GENERATED_FILE_NAMES = {
+    'package-lock.json', 'npm-shrinkwrap.json', 'yarn.lock', 'pnpm-lock.yaml',
+    'composer.lock', 'Gemfile.lock', 'Cargo.lock', 'poetry.lock', 'Pipfile.lock',
+    'go.sum', 'mix.lock', 'pubspec.lock'
+}
+
+GENERATED_FILE_PATTERNS = [
+    '*.min.js', '*.min.css', '*-min.js', '*.bundle.js', '*.map',
+    '*_pb2.py', '*_pb2_grpc.py', '*.pb.go', '*.pb.cc', '*.pb.h',
+    '*.generated.*', '*.g.dart', '*.freezed.dart', '*.snap'
+]
+
+# Markers that code generators put at the top of their output
+GENERATED_MARKERS = re.compile(
+    r'@generated|code generated by|generated by the protocol buffer compiler|'
+    r'(?:this|the) file (?:is|was|has been) (?:auto-?|automatically )?generated|'
+    r'automatically generated by|auto-?generated (?:file|code|by)|'
+    r'generated.{0,40}do not edit|do not edit.{0,40}generated',
+    re.IGNORECASE
+)
+
+# Content heuristics, applied to the first SAMPLE_SIZE bytes of a file
+SAMPLE_SIZE = 64 * 1024
+HEADER_LINES = 10
+MINIFIED_AVG_LINE_LENGTH = 300
+MINIFIED_MAX_LINE_LENGTH = 1000
+HIGH_ENTROPY_THRESHOLD = 5.5
+MIN_ENTROPY_SAMPLE = 1024
+
+class PathRule:
+    """A single .gitignore or .gitattributes pattern, scoped to the directory it came from."""
+
+    def __init__(self, pattern: str, base: str = ""):
+        self.negated = pattern.startswith('!')
+        if self.negated:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith('/')
+        pattern = pattern.strip('/') if self.dir_only else pattern
+        anchored = '/' in pattern.rstrip('/')
+        pattern = pattern.lstrip('/')
+
+        prefix = re.escape(base) + '/' if base else ''
+        if not anchored:
+            prefix += '(?:.*/)?'
+        self.regex = re.compile(f"^{prefix}{translate_pattern(pattern)}(/.*)?$")
+
+    def matches(self, path: str, is_dir: bool = False) -> bool:
+        """Check whether a repo-relative path matches this rule."""
+        match = self.regex.match(path)
+        if not match:
+            return False
+        # Directory-only patterns match the directory itself or anything below it
+        return not self.dir_only or is_dir or match.group(1) is not None
+
+def translate_pattern(pattern: str) -> str:
+    """Translate a gitignore-style glob into a regular expression fragment."""
+    result = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith('**/', i):
+            result.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            result.append('.*')
+            i += 2
+            continue
+        if char == '*':
+            result.append('[^/]*')
+        elif char == '?':
+            result.append('[^/]')
+        elif char == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                result.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                result.append(f"[{body}]")
+                i = end
+        else:
+            result.append(re.escape(char))
+        i += 1
+    return ''.join(result)
+
+def compile_glob(pattern: str) -> re.Pattern:
+    """
+    Compile a repo-relative path glob with .gitignore semantics.
+
+    "*" and "?" stop at "/", while "**" matches any number of directories,
+    so "src/*.py" matches "src/a.py" but not "src/api/b.py". A pattern
+    without a "/" (other than a trailing one) matches at any depth, so
+    "*_test.py" also matches "src/api/b_test.py"; a leading "/" anchors
+    it at the root.
+    """
+    anchored = '/' in pattern.rstrip('/')
+    prefix = '' if anchored else '(?:.*/)?'
+    return re.compile(f"^{prefix}{translate_pattern(pattern.lstrip('/'))}$")
+
+def load_gitignore(repo_path: str, relative_dir: str) -> List[PathRule]:
+    """
+    Load the .gitignore rules of a single directory.
+
+    Args:
+        repo_path: Path to the repository root.
+        relative_dir: Directory relative to the root ("" for the root).
+
+    Returns:
+        List[PathRule]: The rules, in file order.
+    """
+    rules = []
+    ignore_path = os.path.join(repo_path, relative_dir, '.gitignore')
+    if not os.path.isfile(ignore_path):
+        return rules
+
+    try:
+        with open(ignore_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                line = line.rstrip('\n').rstrip()
+                if not line or line.startswith('#'):
+                    continue
+                if line.startswith('\\'):
+                    line = line[1:]
+                rules.append(PathRule(line, relative_dir))
+    except OSError:
+        pass
+
+    return rules
+
+def load_gitattributes(repo_path: str) -> List[Tuple[PathRule, str, bool]]:
+    """
+    Load the linguist-generated and linguist-vendored attributes from the
+    root .gitattributes file.
+
+    Returns:
+        List of (rule, attribute, value) tuples, in file order.
+    """
+    attributes = []
+    attributes_path = os.path.join(repo_path, '.gitattributes')
+    if not os.path.isfile(attributes_path):
+        return attributes
+
+    try:
+        with open(attributes_path, 'r', encoding='utf-8', errors='ignore') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 2 or parts[0].startswith('#'):
+                    continue
+                rule = PathRule(parts[0])
+                for attr in parts[1:]:
+                    value = not attr.startswith('-') and not attr.endswith('=false')
+                    name = attr.lstrip('-').split('=')[0]
+                    if name in ('linguist-generated', 'linguist-vendored'):
+                        attributes.append((rule, name, value))
+    except OSError:
+        pass
+
+    return attributes
+
+def is_ignored(rules: List[PathRule], path: str, is_dir: bool = False) -> bool:
+    """Apply gitignore rules to a path; the last matching rule wins."""
+    ignored = False
+    for rule in rules:
+        if rule.matches(path, is_dir):
+            ignored = not rule.negated
+    return ignored
+
+def linguist_attribute(attributes: List[Tuple[PathRule, str, bool]], path: str) -> Optional[str]:
+    """Return "generated" or "vendored" if .gitattributes marks the path as such."""
+    values = {}
+    for rule, name, value in attributes:
+        if rule.matches(path):
+            values[name] = value
+
+    if values.get('linguist-generated'):
+        return "generated"
+    if values.get('linguist-vendored'):
+        return "vendored"
+    return None
+
+def shannon_entropy(text: str) -> float:
+    """Shannon entropy of a string, in bits per character."""
+    if not text:
+        return 0.0
+    counts = Counter(text)
+    total = len(text)
+    return -sum((n / total) * math.log2(n / total) for n in counts.values())
+
+def classify_content(sample: str) -> Optional[str]:
+    """
+    Detect generated, minified or encoded content from a sample of a file.
+
+    Args:
+        sample: The beginning of the file.
+
+    Returns:
+        Optional[str]: The reason to skip the file, or None to keep it.
+    """
+    lines = sample.split('\n')
+
+    header = '\n'.join(lines[:HEADER_LINES])
+    if GENERATED_MARKERS.search(header):
+        return "generated (header marker)"
+
+    non_empty = [len(line) for line in lines if line.strip()]
+    if non_empty:
+        avg_length = sum(non_empty) / len(non_empty)
+        if avg_length > MINIFIED_AVG_LINE_LENGTH or \
+           (max(non_empty) > MINIFIED_MAX_LINE_LENGTH and len(non_empty) <= 3):
+            return "minified"
+
+    # Encoded blobs are ASCII; non-Latin text has a large alphabet and would look random
+    if len(sample) >= MIN_ENTROPY_SAMPLE and sample.isascii() and \
+       shannon_entropy(sample) > HIGH_ENTROPY_THRESHOLD:
+        return "high entropy"
+
+    return None
+
+class FileClassifier:
+    """
+    Decides which files in a repository are worth chunking and embedding.
+
+    Files are rejected by per-repo include/exclude globs, .gitignore,
+    .gitattributes linguist attributes, well-known generated file names,
+    a size cap and cheap content heuristics, in that order.
+    """
+
+    def __init__(self, repo_path: str, options: Optional[Dict[str, Any]] = None):
+        options = options or {}
+        self.repo_path = repo_path
+        self.include = [compile_glob(p) for p in options.get("include") or []]
+        self.exclude = [compile_glob(p) for p in options.get("exclude") or []]
+        max_file_size = options.get("max_file_size")
+        self.max_file_size = max_file_size if max_file_size is not None else DEFAULT_MAX_FILE_SIZE
+        self.gitignore_rules: Dict[str, List[PathRule]] = {}
+        self.attributes = load_gitattributes(repo_path)
+        self.skipped: List[Dict[str, Any]] = []
+
+    def skip(self, path: str, reason: str, **details: Any) -> bool:
+        """Record a skipped path and its reason."""
+        self.skipped.append({"path": path, "reason": reason, **details})
+        return False
+
+    def rules_for(self, relative_dir: str) -> List[PathRule]:
+        """Collect the .gitignore rules that apply to a directory, root first."""
+        rules = []
+        parts = relative_dir.split('/') if relative_dir else []
+        for i in range(len(parts) + 1):
+            current = '/'.join(parts[:i])
+            if current not in self.gitignore_rules:
+                self.gitignore_rules[current] = load_gitignore(self.repo_path, current)
+            rules.extend(self.gitignore_rules[current])
+        return rules
+
+    def keep_directory(self, relative_dir: str) -> bool:
+        """Check whether the walk should descend into a directory."""
+        name = relative_dir.split('/')[-1]
+        if name.startswith('.'):
+            return False
+        if name in IGNORED_DIRECTORIES:
+            return self.skip(f"{relative_dir}/", "ignored directory")
+
+        parent = relative_dir.rsplit('/', 1)[0] if '/' in relative_dir else ""
+        if is_ignored(self.rules_for(parent), relative_dir, is_dir=True):
+            return self.skip(f"{relative_dir}/", "gitignore")
+        return True
+
+    def keep_file(self, file_path: str, relative_path: str) -> bool:
+        """Check whether a file should be chunked, recording why if not."""
+        if self.include and not any(p.match(relative_path) for p in self.include):
+            return self.skip(relative_path, "not included")
+        if any(p.match(relative_path) for p in self.exclude):
+            return self.skip(relative_path, "excluded")
+
+        relative_dir = relative_path.rsplit('/', 1)[0] if '/' in relative_path else ""
+        if is_ignored(self.rules_for(relative_dir), relative_path):
+            return self.skip(relative_path, "gitignore")
+
+        attribute = linguist_attribute(self.attributes, relative_path)
+        if attribute:
+            return self.skip(relative_path, f"{attribute} (gitattributes)")
+
+        name = os.path.basename(relative_path)
+        if name in GENERATED_FILE_NAMES or any(fnmatch.fnmatch(name, p) for p in GENERATED_FILE_PATTERNS):
+            return self.skip(relative_path, "generated (file name)")
+
+        try:
+            size = os.path.getsize(file_path)
+        except OSError:
+            return self.skip(relative_path, "unreadable")
+        if size > self.max_file_size:
+            return self.skip(relative_path, "too large", size=size)
+
+        try:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                sample = f.read(SAMPLE_SIZE)
+        except OSError:
+            return self.skip(relative_path, "unreadable")
+
+        reason = classify_content(sample)
+        if reason:
+            return self.skip(relative_path, reason)
+        return True
+
+def summarize_skipped(skipped: List[Dict[str, Any]], max_files: int = 200) -> Dict[str, Any]:
+    """
+    Summarize skipped files for status reporting.
+
+    Args:
+        skipped: The records collected by a FileClassifier.
+        max_files: Maximum number of individual records to include.
+
+    Returns:
+        Dict[str, Any]: Total count, counts per reason and a sample of records.
+    """
+    return {
+        "total": len(skipped),
+        "by_reason": dict(Counter(item["reason"] for item in skipped)),
+        "files": skipped[:max_files]
+    }
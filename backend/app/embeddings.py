@@ -8,6 +8,9 @@ load_dotenv()
 
 # Embedding model configuration
 EMBEDDING_MODEL = "text-embedding-3-small"
+MAX_EMBEDDING_CHARS = 25000
+# Number of inputs sent in a single embeddings request
+EMBEDDING_BATCH_SIZE = 256
 embedding_client: OpenAI | None = None
 
 def initialize_embedding_model():
@@ -38,8 +41,8 @@ def get_embeddings(text: str) -> List[float]:
     if not text or not isinstance(text, str):
         return []
 
-    if len(text) > 25000:
-        text = text[:25000]
+    if len(text) > MAX_EMBEDDING_CHARS:
+        text = text[:MAX_EMBEDDING_CHARS]
 
     try:
         response = embedding_client.embeddings.create(
@@ -50,3 +53,41 @@ def get_embeddings(text: str) -> List[float]:
     except Exception as e:
         print(f"Error generating embeddings: {e}")
         return []
+
+def get_embeddings_batch(texts: List[str], batch_size: int = EMBEDDING_BATCH_SIZE) -> List[List[float]]:
+    """
+    Generate embeddings for many texts with as few API requests as possible.
+    
+    Args:
+        texts: The texts to generate embeddings for.
+        batch_size: Maximum number of texts per request.
+        
+    Returns:
+        List[List[float]]: One embedding per text, in order. Texts that are
+        empty or whose batch failed get an empty list.
+    """
+    global embedding_client
+    if embedding_client is None:
+        initialize_embedding_model()
+
+    embeddings: List[List[float]] = [[] for _ in texts]
+    valid = [
+        (idx, text[:MAX_EMBEDDING_CHARS])
+        for idx, text in enumerate(texts)
+        if text and isinstance(text, str)
+    ]
+
+    for i in range(0, len(valid), batch_size):
+        batch = valid[i:i + batch_size]
+        try:
+            response = embedding_client.embeddings.create(
+                input=[text for _, text in batch],
+                model=EMBEDDING_MODEL
+            )
+            # The API returns one item per input, tagged with its position
+            for item in response.data:
+                embeddings[batch[item.index][0]] = item.embedding
+        except Exception as e:
+            print(f"Error generating embeddings: {e}")
+
+    return embeddings
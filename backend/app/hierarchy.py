@@ -0,0 +1,83 @@
+import numpy as np
+from typing import List, Dict, Any
+
+def normalized_mean(vectors: List[List[float]]) -> List[float]:
+    """
+    Average a group of embeddings into a single unit-length vector.
+
+    Args:
+        vectors: The embeddings to average.
+
+    Returns:
+        List[float]: The normalized centroid.
+    """
+    centroid = np.mean(np.asarray(vectors, dtype=np.float32), axis=0)
+    norm = np.linalg.norm(centroid)
+    if norm > 0:
+        centroid /= norm
+    return centroid.tolist()
+
+def build_summaries(embeddings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Build file-level and directory-level representative vectors.
+
+    A file's vector is the normalized mean of its chunk embeddings, and a
+    directory's vector is the normalized mean of every file in its subtree,
+    so no extra embedding requests are needed. Files at the repository root
+    are grouped under the "" directory, which covers only those files.
+
+    Args:
+        embeddings: Chunk embeddings with metadata, as passed to store_embeddings.
+
+    Returns:
+        List[Dict[str, Any]]: Summaries with "level" ("file" or "directory"),
+        "path", "embedding", "chunk_count" and the "point_ids" of the chunks
+        they cover, plus "extension" and "language" for files.
+    """
+    files: Dict[str, Dict[str, Any]] = {}
+    for item in embeddings:
+        if not item.get("embedding"):
+            continue
+        path = item["path"].replace("\\", "/")
+        entry = files.setdefault(path, {
+            "extension": item.get("extension"),
+            "language": item.get("language", "text"),
+            "vectors": [],
+            "point_ids": []
+        })
+        entry["vectors"].append(item["embedding"])
+        if item.get("point_id") is not None:
+            entry["point_ids"].append(item["point_id"])
+
+    summaries = []
+    directories: Dict[str, Dict[str, Any]] = {}
+    for path, entry in files.items():
+        file_vector = normalized_mean(entry["vectors"])
+        summaries.append({
+            "level": "file",
+            "path": path,
+            "embedding": file_vector,
+            "chunk_count": len(entry["vectors"]),
+            "point_ids": entry["point_ids"],
+            "extension": entry["extension"],
+            "language": entry["language"]
+        })
+
+        parts = path.split("/")[:-1]
+        ancestors = ["/".join(parts[:i + 1]) for i in range(len(parts))] or [""]
+        for directory in ancestors:
+            group = directories.setdefault(directory, {"vectors": [], "chunk_count": 0, "point_ids": []})
+            group["vectors"].append(file_vector)
+            group["chunk_count"] += len(entry["vectors"])
+            group["point_ids"].extend(entry["point_ids"])
+
+    for directory, group in directories.items():
+        summaries.append({
+            "level": "directory",
+            "path": directory,
+            "embedding": normalized_mean(group["vectors"]),
+            "chunk_count": group["chunk_count"],
+            "point_ids": group["point_ids"]
+        })
+
+    return summaries
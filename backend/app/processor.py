@@ -1,9 +1,10 @@
 import os
 import re
-from typing import List, Dict, Any, Tuple, Callable
+from typing import List, Dict, Any, Tuple, Callable, Optional
 import pygments
 from pygments.lexers import get_lexer_for_filename, ClassNotFound
 from .repository import is_binary_file
+from .classifier import FileClassifier
 
 # File extensions to process
 CODE_EXTENSIONS = {
@@ -14,83 +15,124 @@ CODE_EXTENSIONS = {
     '.lua', '.ex', '.exs', '.erl', '.hrl', '.hs', '.sql', '.r'
 }
 
-def process_repository(repo_path: str, progress_callback: Callable[[int], None] = None) -> List[Dict[str, Any]]:
+# Bump when chunking changes, so indexes built by an older chunker can be told apart
+CHUNKER_VERSION = "1"
+
+# Language names for extensions, used to filter searches by language
+EXTENSION_LANGUAGES = {
+    '.py': 'python', '.js': 'javascript', '.jsx': 'javascript',
+    '.ts': 'typescript', '.tsx': 'typescript', '.java': 'java',
+    '.c': 'c', '.h': 'c', '.cpp': 'cpp', '.hpp': 'cpp', '.cs': 'csharp',
+    '.go': 'go', '.rb': 'ruby', '.php': 'php', '.html': 'html',
+    '.css': 'css', '.scss': 'scss', '.sass': 'sass', '.less': 'less',
+    '.json': 'json', '.xml': 'xml', '.yaml': 'yaml', '.yml': 'yaml',
+    '.md': 'markdown', '.rst': 'rst', '.txt': 'text', '.sh': 'shell',
+    '.bash': 'shell', '.zsh': 'shell', '.ps1': 'powershell', '.pl': 'perl',
+    '.pm': 'perl', '.swift': 'swift', '.kt': 'kotlin', '.kts': 'kotlin',
+    '.rs': 'rust', '.dart': 'dart', '.lua': 'lua', '.ex': 'elixir',
+    '.exs': 'elixir', '.erl': 'erlang', '.hrl': 'erlang', '.hs': 'haskell',
+    '.sql': 'sql', '.r': 'r'
+}
+
+def collect_repository_files(repo_path: str, options: Optional[Dict[str, Any]] = None,
+                             skipped_files: Optional[List[Dict[str, Any]]] = None) -> List[Tuple[str, str, str]]:
     """
-    Process all files in a repository and prepare them for embedding.
+    Walk a repository and classify which files should be chunked.
     
     Args:
         repo_path: Path to the cloned repository.
-        progress_callback: Optional callback function to report progress.
+        options: Optional classification options ("include", "exclude",
+            "max_file_size").
+        skipped_files: Optional list that receives a record for every
+            skipped file or directory and the reason it was skipped.
         
     Returns:
-        List[Dict[str, Any]]: List of processed files with metadata.
+        List[Tuple[str, str, str]]: (absolute path, relative path, extension)
+        for every file to process.
     """
-    processed_files = []
-    total_files = 0
-    processed_count = 0
+    classifier = FileClassifier(repo_path, options)
+    eligible_files = []
     
-    # First, count total eligible files
-    for root, _, files in os.walk(repo_path):
-        if any(part.startswith('.') for part in root.split(os.sep)) or \
-           any(ignore_dir in root.split(os.sep) for ignore_dir in ['node_modules', 'venv', '__pycache__', 'build', 'dist']):
-            continue
-            
+    for root, dirs, files in os.walk(repo_path):
+        relative_root = os.path.relpath(root, repo_path).replace(os.sep, '/')
+        relative_root = '' if relative_root == '.' else relative_root
+        
+        # Prune ignored directories so the walk never descends into them
+        dirs[:] = [
+            d for d in dirs
+            if classifier.keep_directory(f"{relative_root}/{d}" if relative_root else d)
+        ]
+        
         for file in files:
             if file.startswith('.'):
                 continue
                 
-            file_path = os.path.join(root, file)
-            if is_binary_file(file_path):
-                continue
-                
+            # Skip files with extensions we don't want to process
             ext = os.path.splitext(file)[1].lower()
-            if ext in CODE_EXTENSIONS:
-                total_files += 1
-    
-    # Process files
-    for root, _, files in os.walk(repo_path):
-        if any(part.startswith('.') for part in root.split(os.sep)) or \
-           any(ignore_dir in root.split(os.sep) for ignore_dir in ['node_modules', 'venv', '__pycache__', 'build', 'dist']):
-            continue
-        
-        for file in files:
-            if file.startswith('.'):
+            if ext not in CODE_EXTENSIONS:
                 continue
-                
+            
             file_path = os.path.join(root, file)
-            relative_path = os.path.relpath(file_path, repo_path)
+            relative_path = f"{relative_root}/{file}" if relative_root else file
             
             if is_binary_file(file_path):
                 continue
-                
-            # Skip files with extensions we don't want to process
-            ext = os.path.splitext(file)[1].lower()
-            if ext not in CODE_EXTENSIONS:
-                continue
             
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # Break the file into chunks respecting code boundaries
-                chunks = chunk_file(content, relative_path)
-                
-                for idx, chunk in enumerate(chunks):
-                    processed_files.append({
-                        "path": f"{relative_path}",
-                        "chunk_id": idx,
-                        "content": chunk,
-                        "extension": ext
-                    })
+            if classifier.keep_file(file_path, relative_path):
+                eligible_files.append((file_path, relative_path, ext))
+    
+    if skipped_files is not None:
+        skipped_files.extend(classifier.skipped)
+    
+    return eligible_files
+
+def process_repository(repo_path: str, progress_callback: Callable[[int], None] = None,
+                       options: Optional[Dict[str, Any]] = None,
+                       skipped_files: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """
+    Process all files in a repository and prepare them for embedding.
+    
+    Args:
+        repo_path: Path to the cloned repository.
+        progress_callback: Optional callback function to report progress.
+        options: Optional classification options (see collect_repository_files).
+        skipped_files: Optional list that receives the skipped files and reasons.
+        
+    Returns:
+        List[Dict[str, Any]]: List of processed files with metadata.
+    """
+    processed_files = []
+    processed_count = 0
+    
+    eligible_files = collect_repository_files(repo_path, options, skipped_files)
+    total_files = len(eligible_files)
+    
+    # Process files
+    for file_path, relative_path, ext in eligible_files:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            
+            # Break the file into chunks respecting code boundaries
+            chunks = chunk_file(content, relative_path)
+            
+            for idx, chunk in enumerate(chunks):
+                processed_files.append({
+                    "path": f"{relative_path}",
+                    "chunk_id": idx,
+                    "content": chunk,
+                    "extension": ext,
+                    "language": EXTENSION_LANGUAGES.get(ext, "text")
+                })
+            
+            processed_count += 1
+            if progress_callback and total_files > 0:
+                progress = int((processed_count / total_files) * 100)
+                progress_callback(progress)
                 
-                processed_count += 1
-                if progress_callback and total_files > 0:
-                    progress = int((processed_count / total_files) * 100)
-                    progress_callback(progress)
-                    
-            except Exception as e:
-                # Skip files that can't be read properly
-                continue
+        except Exception as e:
+            # Skip files that can't be read properly
+            continue
     
     return processed_files
 
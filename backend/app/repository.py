@@ -1,16 +1,18 @@
 import os
 import tempfile
-from git import Repo
+from git import Repo, GitCommandError
 import shutil
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import re
 
-def clone_repository(repo_url: str) -> str:
+def clone_repository(repo_url: str, ref: Optional[str] = None) -> str:
     """
     Clone a GitHub repository to a temporary directory.
     
     Args:
         repo_url: The URL of the GitHub repository to clone.
+        ref: Optional branch, tag or commit SHA to check out; defaults to
+            the repository's default branch.
         
     Returns:
         str: Path to the cloned repository.
@@ -30,6 +32,8 @@ def clone_repository(repo_url: str) -> str:
     try:
         # Clone the repository
         repo = Repo.clone_from(repo_url, temp_dir)
+        if ref:
+            repo.git.checkout("--detach", resolve_ref(repo, ref))
         return temp_dir
     except Exception as e:
         # Clean up the temporary directory if cloning fails
@@ -37,6 +41,48 @@ def clone_repository(repo_url: str) -> str:
             shutil.rmtree(temp_dir)
         raise Exception(f"Failed to clone repository: {str(e)}")
 
+def resolve_ref(repo: Repo, ref: str) -> str:
+    """
+    Resolve a branch, tag or commit SHA to the commit it names.
+    
+    Only revisions are accepted, so a ref that is also a file path is never
+    checked out as a file, and a ref starting with "-" is never parsed as
+    an option. Branches other than the default one only exist as
+    remote-tracking branches in a fresh clone, so "origin/<ref>" is tried too.
+    
+    Args:
+        repo: The cloned repository.
+        ref: The ref to resolve.
+        
+    Returns:
+        str: The commit SHA.
+        
+    Raises:
+        ValueError: If the ref doesn't name a commit.
+    """
+    if not ref.startswith("-"):
+        for candidate in (ref, f"origin/{ref}"):
+            try:
+                return repo.git.rev_parse("--verify", "--quiet", f"{candidate}^{{commit}}")
+            except GitCommandError:
+                continue
+    raise ValueError(f"Unknown ref: {ref}")
+
+def get_commit_sha(repo_path: str) -> Optional[str]:
+    """
+    Get the SHA of the commit checked out in a repository.
+    
+    Args:
+        repo_path: Path to the cloned repository.
+        
+    Returns:
+        Optional[str]: The commit SHA, or None if it can't be determined.
+    """
+    try:
+        return Repo(repo_path).head.commit.hexsha
+    except Exception:
+        return None
+
 def is_binary_file(file_path: str) -> bool:
     """
     Check if a file is binary.
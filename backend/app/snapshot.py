@@ -0,0 +1,335 @@
+"""
+Portable index snapshots.
+
+A snapshot holds everything needed to serve queries for a repository
+without cloning or embedding it again: the vectors and payloads of its
+collections plus the embedding model and chunker version they were built
+with and the commit SHA of every indexed ref, as recorded in the
+repository's metadata collection. Ref manifests travel in the "refs"
+payload of each point.
+
+Layout (little-endian), written and read as a stream of frames:
+
+    MAGIC, u32 format version
+    frame: 1-byte type, u64 body length, body
+
+    H  header, JSON
+    C  start of a collection, JSON {"kind": ..., "count": ...}
+    B  block of points: u32 count, u32 dim, u64 payload length,
+       count u64 ids, count*dim float32 vectors, zlib-compressed JSON payloads
+    E  end of snapshot
+
+Blocks are columnar so vectors can be loaded straight into numpy arrays.
+Imports load into staging collections that only replace the live ones once
+the end frame has been read, so a truncated upload leaves the old index.
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import uuid
+import struct
+import argparse
+import numpy as np
+from qdrant_client.http import models
+from typing import Iterator, Dict, Any, BinaryIO, Optional, Tuple
+
+from . import vector_db
+from .embeddings import EMBEDDING_MODEL
+
+MAGIC = b"GITRAGSN"
+FORMAT_VERSION = 2
+BLOCK_SIZE = 1000
+EMBEDDING_DIM = 1536
+
+FRAME_HEADER = struct.Struct("<cQ")
+BLOCK_HEADER = struct.Struct("<IIQ")
+
+def collection_kinds(repo_url: str) -> Dict[str, Dict[str, Any]]:
+    """Collections that make up a repository's index, keyed by snapshot kind."""
+    return {
+        "chunks": {
+            "name": vector_db.get_collection_name(repo_url),
+            "indexed_fields": vector_db.INDEXED_PAYLOAD_FIELDS
+        },
+        "summary": {
+            "name": vector_db.get_summary_collection_name(repo_url),
+            "indexed_fields": vector_db.INDEXED_PAYLOAD_FIELDS + ["level"]
+        }
+    }
+
+def frame(frame_type: bytes, body: bytes) -> bytes:
+    """Encode a single frame."""
+    return FRAME_HEADER.pack(frame_type, len(body)) + body
+
+def iter_snapshot(repo_url: str, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+    """
+    Stream a repository's index as snapshot bytes.
+
+    Args:
+        repo_url: The repository URL.
+        block_size: Number of points per block.
+
+    Yields:
+        bytes: Consecutive pieces of the snapshot.
+
+    Raises:
+        ValueError: If the repository has not been indexed or has no index metadata.
+    """
+    if not vector_db.qdrant_client:
+        vector_db.initialize_vector_db()
+    client = vector_db.qdrant_client
+
+    kinds = {
+        kind: info for kind, info in collection_kinds(repo_url).items()
+        if vector_db.collection_exists(info["name"])
+    }
+    if "chunks" not in kinds:
+        raise ValueError(f"Repository {repo_url} has not been indexed")
+
+    # Don't guess how the vectors were built; that is what an importer checks
+    metadata = vector_db.get_index_metadata(repo_url)
+    if "embedding_model" not in metadata:
+        raise ValueError(f"Repository {repo_url} has no index metadata; index it again before exporting")
+    header = {
+        "repo_url": repo_url,
+        "refs": metadata["refs"],
+        "embedding_model": metadata["embedding_model"],
+        "chunker_version": metadata.get("chunker_version"),
+        "dim": EMBEDDING_DIM,
+        "created_at": time.time(),
+        "collections": list(kinds)
+    }
+
+    yield MAGIC + struct.pack("<I", FORMAT_VERSION)
+    yield frame(b"H", json.dumps(header).encode())
+
+    for kind, info in kinds.items():
+        count = client.count(collection_name=info["name"], exact=True).count
+        yield frame(b"C", json.dumps({"kind": kind, "count": count}).encode())
+
+        offset = None
+        while True:
+            records, offset = client.scroll(
+                collection_name=info["name"],
+                limit=block_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=True
+            )
+            if records:
+                ids = np.array([record.id for record in records], dtype="<u8")
+                vectors = np.array([record.vector for record in records], dtype="<f4")
+                payloads = zlib.compress(json.dumps([record.payload for record in records]).encode())
+                body = b"".join([
+                    BLOCK_HEADER.pack(len(records), vectors.shape[1], len(payloads)),
+                    ids.tobytes(),
+                    vectors.tobytes(),
+                    payloads
+                ])
+                yield frame(b"B", body)
+            if offset is None:
+                break
+
+    yield frame(b"E", b"")
+
+def export_snapshot(repo_url: str, output: BinaryIO) -> int:
+    """
+    Write a repository's index to a binary file object.
+
+    Returns:
+        int: Number of bytes written.
+    """
+    written = 0
+    for piece in iter_snapshot(repo_url):
+        output.write(piece)
+        written += len(piece)
+    return written
+
+def read_exactly(stream: BinaryIO, size: int) -> bytes:
+    """Read exactly size bytes from a stream."""
+    data = stream.read(size)
+    if len(data) != size:
+        raise ValueError("Snapshot is truncated")
+    return data
+
+def load_frames(stream: BinaryIO, repo_url: Optional[str], staged: Dict[str, str]) -> Tuple[Dict[str, Any], int]:
+    """
+    Read a snapshot's frames into new staging collections.
+
+    Args:
+        stream: Binary file object positioned after the format version.
+        repo_url: Optional repository URL to load the snapshot under.
+        staged: Filled with the staging collection created for each kind,
+            so the caller can swap them in or clean them up.
+
+    Returns:
+        Tuple[Dict[str, Any], int]: The snapshot header and the number of
+        points loaded.
+    """
+    client = vector_db.qdrant_client
+    header = None
+    kinds = None
+    collection_name = None
+    points_loaded = 0
+
+    while True:
+        frame_type, length = FRAME_HEADER.unpack(read_exactly(stream, FRAME_HEADER.size))
+        body = read_exactly(stream, length)
+
+        # Malformed bodies surface as many exception types; report them all as a bad snapshot
+        try:
+            if frame_type == b"H":
+                header = json.loads(body)
+                if header["embedding_model"] != EMBEDDING_MODEL:
+                    raise ValueError(
+                        f"Snapshot was built with {header['embedding_model']}, "
+                        f"but queries are embedded with {EMBEDDING_MODEL}"
+                    )
+                if header["dim"] != EMBEDDING_DIM:
+                    raise ValueError(f"Snapshot has {header['dim']}-dimensional vectors")
+                repo_url = repo_url or header["repo_url"]
+                kinds = collection_kinds(repo_url)
+
+            elif frame_type == b"C":
+                if header is None:
+                    raise ValueError("Snapshot is missing its header")
+                kind = json.loads(body)["kind"]
+                info = kinds[kind]
+                collection_name = f"{info['name']}_import_{uuid.uuid4().hex[:12]}"
+                staged[kind] = collection_name
+                vector_db.create_collection(collection_name, info["indexed_fields"])
+
+            elif frame_type == b"B":
+                if collection_name is None:
+                    raise ValueError("Snapshot block outside of a collection")
+                count, dim, payload_length = BLOCK_HEADER.unpack_from(body)
+                offset = BLOCK_HEADER.size
+                ids = np.frombuffer(body, dtype="<u8", count=count, offset=offset)
+                offset += count * 8
+                vectors = np.frombuffer(body, dtype="<f4", count=count * dim, offset=offset).reshape(count, dim)
+                offset += count * dim * 4
+                payloads = json.loads(zlib.decompress(body[offset:offset + payload_length]))
+
+                if repo_url != header["repo_url"]:
+                    for payload in payloads:
+                        payload["repo_url"] = repo_url
+
+                client.upsert(
+                    collection_name=collection_name,
+                    points=models.Batch(
+                        ids=ids.tolist(),
+                        vectors=vectors.tolist(),
+                        payloads=payloads
+                    )
+                )
+                points_loaded += count
+
+            elif frame_type == b"E":
+                if header is None:
+                    raise ValueError("Snapshot is missing its header")
+                return header, points_loaded
+
+            else:
+                raise ValueError(f"Unknown snapshot frame type {frame_type!r}")
+        except (KeyError, IndexError, TypeError, struct.error, zlib.error) as e:
+            raise ValueError("Snapshot is corrupt") from e
+
+def import_snapshot(stream: BinaryIO, repo_url: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load a snapshot into the vector database, replacing any existing index.
+
+    The existing index keeps serving queries until the whole snapshot has
+    been loaded, and is left untouched if loading fails.
+
+    Args:
+        stream: Binary file object positioned at the start of a snapshot.
+        repo_url: Optional repository URL to load the snapshot under;
+            defaults to the URL recorded in the snapshot.
+
+    Returns:
+        Dict[str, Any]: The snapshot header and the number of points loaded.
+
+    Raises:
+        ValueError: If the snapshot is malformed or was built with a
+            different embedding model.
+    """
+    if not vector_db.qdrant_client:
+        vector_db.initialize_vector_db()
+
+    if read_exactly(stream, len(MAGIC)) != MAGIC:
+        raise ValueError("Not a snapshot file")
+    version, = struct.unpack("<I", read_exactly(stream, 4))
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version {version}")
+
+    staged: Dict[str, str] = {}
+    try:
+        header, points_loaded = load_frames(stream, repo_url, staged)
+        repo_url = repo_url or header["repo_url"]
+
+        # The metadata is staged too, so refs the snapshot doesn't have are dropped with their points
+        metadata_collection = vector_db.get_metadata_collection_name(repo_url)
+        staged["meta"] = f"{metadata_collection}_import_{uuid.uuid4().hex[:12]}"
+        vector_db.create_metadata_collection(staged["meta"])
+        vector_db.set_index_metadata(
+            repo_url,
+            collection_name=staged["meta"],
+            embedding_model=header["embedding_model"],
+            chunker_version=header["chunker_version"]
+        )
+        for ref, ref_metadata in header["refs"].items():
+            vector_db.set_ref_metadata(repo_url, ref, collection_name=staged["meta"], **ref_metadata)
+    except BaseException:
+        for staging_name in staged.values():
+            vector_db.delete_collection(staging_name)
+        raise
+
+    for kind, info in collection_kinds(repo_url).items():
+        if kind in staged:
+            vector_db.replace_collection(info["name"], staged[kind])
+        else:
+            # A stale summary collection must not outlive a snapshot without one
+            vector_db.delete_collection(info["name"])
+    vector_db.replace_collection(metadata_collection, staged["meta"])
+
+    return {**header, "repo_url": repo_url, "points_loaded": points_loaded}
+
+def main(argv: Optional[list] = None):
+    """Command line entry point: python -m app.snapshot {export,import} ..."""
+    parser = argparse.ArgumentParser(description="Export or import repository index snapshots")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write a repository's index to a snapshot file")
+    export_parser.add_argument("repo_url")
+    export_parser.add_argument("output", help="Snapshot file to write, or - for stdout")
+
+    import_parser = subparsers.add_parser("import", help="Load a snapshot file into the vector database")
+    import_parser.add_argument("input", help="Snapshot file to read, or - for stdin")
+    import_parser.add_argument("--repo-url", help="Load under this URL instead of the one in the snapshot")
+
+    args = parser.parse_args(argv)
+
+    # Without a server, both commands would run against an empty in-memory store that dies with the process
+    if not os.getenv("QDRANT_URL"):
+        parser.error("QDRANT_URL is not set; point it at the Qdrant server holding the index")
+
+    if args.command == "export":
+        if args.output == "-":
+            written = export_snapshot(args.repo_url, sys.stdout.buffer)
+        else:
+            with open(args.output, "wb") as f:
+                written = export_snapshot(args.repo_url, f)
+        print(f"Exported {written} bytes", file=sys.stderr)
+    else:
+        if args.input == "-":
+            result = import_snapshot(sys.stdin.buffer, args.repo_url)
+        else:
+            with open(args.input, "rb") as f:
+                result = import_snapshot(f, args.repo_url)
+        print(f"Imported {result['points_loaded']} points for {result['repo_url']} "
+              f"with refs: {', '.join(result['refs']) or 'none'}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
 import time
 
 class TaskManager:
@@ -27,7 +27,8 @@ class TaskManager:
         }
         
     def update_task(self, task_id: str, status: str = None, progress: int = None, 
-                  message: str = None, error: str = None):
+                  message: str = None, error: str = None,
+                  skipped_files: List[Dict[str, Any]] = None):
         """Update an existing task."""
         if task_id not in self.tasks:
             return False
@@ -50,6 +51,9 @@ class TaskManager:
         if error:
             task["error"] = error
             
+        if skipped_files is not None:
+            task["skipped_files"] = skipped_files
+            
         task["updated_at"] = current_time
         return True
         
@@ -1,19 +1,39 @@
 import os
+import re
+import time
 from qdrant_client import QdrantClient
 from qdrant_client.http import models
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Callable
 import hashlib
 
+from .classifier import compile_glob
+
 # Initialize Qdrant client
 qdrant_client = None
 
+# Ref used when a repository is indexed or queried without one
+DEFAULT_REF = "HEAD"
+
+# Retention applied after every indexing run; 0 disables a rule
+REF_RETENTION_KEEP_LAST = int(os.getenv("REF_RETENTION_KEEP_LAST", "0"))
+REF_RETENTION_MAX_AGE_DAYS = float(os.getenv("REF_RETENTION_MAX_AGE_DAYS", "0"))
+
+# Payload fields that get a keyword index so filters run inside the ANN search
+INDEXED_PAYLOAD_FIELDS = ["path", "extension", "language", "directory", "dirs", "refs"]
+
+# Number of files picked by the first stage of a hierarchical search
+DEFAULT_TOP_FILES = 20
+
 def initialize_vector_db():
     """Initialize the Qdrant vector database client."""
     global qdrant_client
     
-    # Use in-memory storage for simplicity
-    # In production, you would connect to a Qdrant server
-    qdrant_client = QdrantClient(":memory:")
+    # Use in-memory storage unless a Qdrant server is configured
+    qdrant_url = os.getenv("QDRANT_URL")
+    if qdrant_url:
+        qdrant_client = QdrantClient(url=qdrant_url, api_key=os.getenv("QDRANT_API_KEY"))
+    else:
+        qdrant_client = QdrantClient(":memory:")
 
 def get_collection_name(repo_url: str) -> str:
     """
@@ -28,58 +48,742 @@ def get_collection_name(repo_url: str) -> str:
     # Create a hash of the repo URL to ensure a valid collection name
     return f"repo_{hashlib.md5(repo_url.encode()).hexdigest()}"
 
-def store_embeddings(repo_url: str, embeddings: List[Dict[str, Any]]):
+def get_metadata_collection_name(repo_url: str) -> str:
     """
-    Store embeddings in the vector database.
+    Name of the collection holding a repository's index metadata.
+    
+    It has no vectors: one point records the embedding model and chunker
+    version, and one point per indexed ref records its commit SHA and
+    indexing time, so the metadata lives next to the vectors it describes.
+    """
+    return f"{get_collection_name(repo_url)}_meta"
+
+def metadata_point_id(ref: Optional[str] = None) -> int:
+    """ID of the index metadata point, or of a ref's metadata point."""
+    return chunk_point_id("ref", ref) if ref is not None else chunk_point_id("index")
+
+def create_metadata_collection(collection_name: str):
+    """Create a vectorless collection for index metadata."""
+    qdrant_client.create_collection(collection_name=collection_name, vectors_config={})
+
+def write_metadata_point(collection_name: str, point_id: int, payload: Dict[str, Any]):
+    """Merge fields into a metadata point, creating the collection and point as needed."""
+    if not collection_exists(collection_name):
+        create_metadata_collection(collection_name)
+    
+    records = qdrant_client.retrieve(collection_name=collection_name, ids=[point_id], with_payload=True)
+    merged = {**(records[0].payload if records else {}), **payload}
+    qdrant_client.upsert(
+        collection_name=collection_name,
+        points=[models.PointStruct(id=point_id, vector={}, payload=merged)]
+    )
+
+def set_index_metadata(repo_url: str, collection_name: Optional[str] = None, **metadata: Any):
+    """
+    Record metadata about how a repository's index was built.
     
     Args:
         repo_url: The repository URL.
-        embeddings: List of embeddings with metadata.
+        collection_name: Metadata collection to write to; defaults to the
+            repository's own (see get_metadata_collection_name).
+        **metadata: Fields to record, e.g. embedding_model.
     """
     if not qdrant_client:
         initialize_vector_db()
     
-    collection_name = get_collection_name(repo_url)
+    collection_name = collection_name or get_metadata_collection_name(repo_url)
+    write_metadata_point(collection_name, metadata_point_id(), {"kind": "index", **metadata})
+
+def set_ref_metadata(repo_url: str, ref: str, collection_name: Optional[str] = None, **metadata: Any):
+    """Record metadata about an indexed ref, e.g. its commit SHA."""
+    if not qdrant_client:
+        initialize_vector_db()
     
-    # Create collection if it doesn't exist
+    collection_name = collection_name or get_metadata_collection_name(repo_url)
+    write_metadata_point(collection_name, metadata_point_id(ref), {"kind": "ref", "ref": ref, **metadata})
+
+def get_index_metadata(repo_url: str) -> Dict[str, Any]:
+    """
+    Get the metadata recorded for a repository's index.
+    
+    Returns:
+        Dict[str, Any]: The recorded index fields plus "refs", the
+        metadata of every indexed ref keyed by ref.
+    """
+    if not qdrant_client:
+        initialize_vector_db()
+    
+    metadata: Dict[str, Any] = {"refs": {}}
+    collection_name = get_metadata_collection_name(repo_url)
+    if not collection_exists(collection_name):
+        return metadata
+    
+    offset = None
+    while True:
+        records, offset = qdrant_client.scroll(
+            collection_name=collection_name,
+            limit=1000,
+            offset=offset,
+            with_payload=True,
+            with_vectors=False
+        )
+        for record in records:
+            payload = dict(record.payload)
+            kind = payload.pop("kind", None)
+            if kind == "ref":
+                metadata["refs"][payload.pop("ref")] = payload
+            elif kind == "index":
+                metadata.update(payload)
+        if offset is None:
+            return metadata
+
+def delete_ref_metadata(repo_url: str, ref: str) -> bool:
+    """Remove a ref's metadata point, returning True if there was one."""
+    collection_name = get_metadata_collection_name(repo_url)
+    if not collection_exists(collection_name):
+        return False
+    
+    point_id = metadata_point_id(ref)
+    if not qdrant_client.retrieve(collection_name=collection_name, ids=[point_id]):
+        return False
+    qdrant_client.delete(
+        collection_name=collection_name,
+        points_selector=models.PointIdsList(points=[point_id])
+    )
+    return True
+
+def chunk_point_id(*parts: str) -> int:
+    """
+    Derive a content-addressed point ID.
+    
+    Identical parts always give the same unsigned 64-bit ID, so a chunk
+    that is unchanged between refs maps to one stored point.
+    """
+    digest = hashlib.sha256("\0".join(parts).encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+def ref_condition(ref: str) -> models.FieldCondition:
+    """Condition matching the points that belong to a ref."""
+    return models.FieldCondition(key="refs", match=models.MatchValue(value=ref))
+
+def get_summary_collection_name(repo_url: str) -> str:
+    """Name of the collection holding a repository's file and directory vectors."""
+    return f"{get_collection_name(repo_url)}_summary"
+
+def collection_exists(collection_name: str) -> bool:
+    """Check whether a collection exists."""
     try:
         qdrant_client.get_collection(collection_name)
+        return True
     except Exception:
-        # Create a new collection
-        qdrant_client.create_collection(
+        return False
+
+def create_collection(collection_name: str, indexed_fields: List[str]):
+    """
+    Create a collection for OpenAI embeddings and index its filterable payload fields.
+    
+    Args:
+        collection_name: The collection to create.
+        indexed_fields: Payload fields that get a keyword index.
+    """
+    qdrant_client.create_collection(
+        collection_name=collection_name,
+        vectors_config=models.VectorParams(
+            size=1536,  # OpenAI embedding size
+            distance=models.Distance.COSINE
+        )
+    )
+    
+    # Index the filterable payload fields so filters are applied during the search
+    for field_name in indexed_fields:
+        qdrant_client.create_payload_index(
+            collection_name=collection_name,
+            field_name=field_name,
+            field_schema=models.PayloadSchemaType.KEYWORD
+        )
+
+def get_alias_target(name: str) -> Optional[str]:
+    """Return the collection an alias points to, or None if name is not an alias."""
+    for alias in qdrant_client.get_aliases().aliases:
+        if alias.alias_name == name:
+            return alias.collection_name
+    return None
+
+def delete_collection(name: str):
+    """Delete a collection, or an alias and the collection behind it."""
+    target = get_alias_target(name)
+    if target:
+        qdrant_client.update_collection_aliases(change_aliases_operations=[
+            models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=name))
+        ])
+        qdrant_client.delete_collection(target)
+    elif collection_exists(name):
+        qdrant_client.delete_collection(name)
+
+def replace_collection(name: str, staging_name: str):
+    """
+    Make name serve a fully loaded staging collection.
+    
+    Name becomes an alias of the staging collection. If it already is an
+    alias, it is switched in a single atomic operation; a plain collection
+    of that name has to be deleted first.
+    """
+    previous = get_alias_target(name)
+    operations = []
+    if previous:
+        operations.append(models.DeleteAliasOperation(delete_alias=models.DeleteAlias(alias_name=name)))
+    elif collection_exists(name):
+        qdrant_client.delete_collection(name)
+    operations.append(models.CreateAliasOperation(
+        create_alias=models.CreateAlias(collection_name=staging_name, alias_name=name)
+    ))
+    qdrant_client.update_collection_aliases(change_aliases_operations=operations)
+    
+    if previous and previous != staging_name:
+        qdrant_client.delete_collection(previous)
+
+def with_conditions(query_filter: Optional[models.Filter], *conditions: models.Condition) -> Optional[models.Filter]:
+    """Return a copy of a filter with extra conditions that must also hold."""
+    must = list(query_filter.must or []) if query_filter else []
+    must.extend(conditions)
+    return models.Filter(must=must) if must else None
+
+def get_path_payload(path: str) -> Dict[str, Any]:
+    """
+    Build the path-derived payload fields used for filtering.
+    
+    Args:
+        path: The file path relative to the repository root.
+        
+    Returns:
+        Dict[str, Any]: The normalized path, its parent directory and
+        every ancestor directory (so a prefix match is a keyword match).
+    """
+    path = path.replace(os.sep, "/")
+    parts = path.split("/")[:-1]
+    dirs = ["/".join(parts[:i + 1]) for i in range(len(parts))]
+    
+    return {
+        "path": path,
+        "directory": dirs[-1] if dirs else "",
+        "dirs": dirs
+    }
+
+def normalize_extension(extension: str) -> str:
+    """Normalize an extension to the stored form, e.g. "PY" -> ".py"."""
+    extension = extension.strip().lower()
+    if extension and not extension.startswith("."):
+        extension = f".{extension}"
+    return extension
+
+def normalize_path_pattern(pattern: Optional[str]) -> str:
+    """Normalize a user-supplied path prefix or glob to a repo-relative form."""
+    if not pattern:
+        return ""
+    pattern = pattern.replace(os.sep, "/")
+    if pattern.startswith("./"):
+        pattern = pattern[2:]
+    return pattern.lstrip("/")
+
+def glob_conditions(glob: str) -> Tuple[List[models.FieldCondition], bool]:
+    """
+    Derive indexed conditions that every path matching a glob satisfies.
+    
+    The literal leading directories become a "dirs" condition, a literal
+    ".ext" at the end an "extension" condition and a last segment directly
+    below them a "directory" condition. The common shapes "*.ext",
+    "dir/**", "dir/*.ext" and "dir/**/*.ext" are expressed exactly, so
+    they need no post-filter.
+    
+    Args:
+        glob: A normalized path glob (see classifier.compile_glob); a
+            pattern without a "/" matches at any depth unless it starts
+            with one.
+        
+    Returns:
+        Tuple of the conditions and whether they match the glob exactly.
+    """
+    anchored = "/" in glob.rstrip("/")
+    parts = glob.lstrip("/").split("/")
+    literal = []
+    for part in parts[:-1]:
+        if any(char in part for char in "*?["):
+            break
+        literal.append(part)
+    directory = "/".join(literal)
+    rest = parts[len(literal):]
+    
+    conditions = []
+    if directory:
+        conditions.append(models.FieldCondition(key="dirs", match=models.MatchValue(value=directory)))
+    
+    if anchored and len(rest) == 1 and "**" not in rest[0]:
+        # "dir/x*" and "/x*" only match files directly inside dir (or the root)
+        conditions.append(models.FieldCondition(key="directory", match=models.MatchValue(value=directory)))
+    
+    extension_match = re.search(r"\.([^*?\[\]./]+)$", rest[-1])
+    if extension_match:
+        extension = extension_match.group(1)
+        conditions.append(models.FieldCondition(
+            key="extension", match=models.MatchValue(value=f".{extension.lower()}")
+        ))
+        if extension == extension.lower() and rest in ([f"*.{extension}"], ["**", f"*.{extension}"]):
+            return conditions, True
+    
+    return conditions, rest in (["**"], ["*"])
+
+def build_search_filter(filters: Optional[Dict[str, Any]]) -> Tuple[Optional[models.Filter], Optional[Callable[[Dict[str, Any]], bool]]]:
+    """
+    Translate query filters into a Qdrant filter and an optional post-filter.
+    
+    Everything that can be expressed against the indexed payload fields is
+    pushed into the Qdrant filter (see glob_conditions). Other globs and
+    prefixes that end mid-segment are narrowed to indexed conditions inside
+    Qdrant and then finished in Python by the returned predicate, which
+    only reads "path"; searches resolve it to the matching paths first.
+    
+    Args:
+        filters: Optional dict with any of "path_prefix", "path_glob",
+            "extensions", "languages" and "directory".
+        
+    Returns:
+        Tuple of the Qdrant filter (or None) and a payload predicate (or None).
+    """
+    if not filters:
+        return None, None
+    
+    must = []
+    predicates = []
+    
+    def literal_dir_condition(pattern: str):
+        """Add a condition on the deepest directory fully spelled out in pattern."""
+        parts = pattern.split("/")[:-1]
+        literal = []
+        for part in parts:
+            if any(char in part for char in "*?["):
+                break
+            literal.append(part)
+        if literal:
+            must.append(models.FieldCondition(
+                key="dirs",
+                match=models.MatchValue(value="/".join(literal))
+            ))
+    
+    path_prefix = normalize_path_pattern(filters.get("path_prefix"))
+    if path_prefix:
+        if path_prefix.endswith("/"):
+            must.append(models.FieldCondition(
+                key="dirs",
+                match=models.MatchValue(value=path_prefix.rstrip("/"))
+            ))
+        else:
+            literal_dir_condition(path_prefix)
+            predicates.append(lambda payload, prefix=path_prefix: payload["path"].startswith(prefix))
+    
+    path_glob = normalize_path_pattern(filters.get("path_glob"))
+    if path_glob:
+        # A leading "/" or "./" anchors a slashless glob at the root, as in .gitignore
+        if filters["path_glob"].replace(os.sep, "/").startswith(("/", "./")):
+            path_glob = f"/{path_glob}"
+        conditions, exact = glob_conditions(path_glob)
+        must.extend(conditions)
+        if not exact:
+            glob = compile_glob(path_glob)
+            predicates.append(lambda payload: glob.match(payload["path"]) is not None)
+    
+    extensions = [normalize_extension(ext) for ext in filters.get("extensions") or [] if ext.strip()]
+    if extensions:
+        must.append(models.FieldCondition(
+            key="extension",
+            match=models.MatchAny(any=extensions)
+        ))
+    
+    languages = [lang.strip().lower() for lang in filters.get("languages") or [] if lang.strip()]
+    if languages:
+        must.append(models.FieldCondition(
+            key="language",
+            match=models.MatchAny(any=languages)
+        ))
+    
+    directory = filters.get("directory")
+    if directory is not None:
+        must.append(models.FieldCondition(
+            key="directory",
+            match=models.MatchValue(value=directory.replace(os.sep, "/").strip("/"))
+        ))
+    
+    query_filter = models.Filter(must=must) if must else None
+    post_filter = None
+    if predicates:
+        post_filter = lambda payload: all(predicate(payload) for predicate in predicates)
+    
+    return query_filter, post_filter
+
+def get_point_refs(collection_name: str, point_ids: List[int]) -> Dict[int, List[str]]:
+    """
+    Look up which of the given points exist and the refs they belong to.
+    
+    Args:
+        collection_name: The collection to look in.
+        point_ids: The point IDs to look up.
+        
+    Returns:
+        Dict[int, List[str]]: The refs of every point that exists.
+    """
+    existing = {}
+    batch_size = 1000
+    for i in range(0, len(point_ids), batch_size):
+        records = qdrant_client.retrieve(
+            collection_name=collection_name,
+            ids=point_ids[i:i+batch_size],
+            with_payload=["refs"],
+            with_vectors=False
+        )
+        for record in records:
+            existing[record.id] = record.payload.get("refs", [])
+    return existing
+
+def get_ref_points(collection_name: str, ref: str) -> Dict[int, List[str]]:
+    """Get the IDs and refs of every point that belongs to a ref."""
+    points = {}
+    offset = None
+    while True:
+        records, offset = qdrant_client.scroll(
             collection_name=collection_name,
-            vectors_config=models.VectorParams(
-                size=1536,  # OpenAI embedding size
-                distance=models.Distance.COSINE
+            scroll_filter=models.Filter(must=[ref_condition(ref)]),
+            limit=1000,
+            offset=offset,
+            with_payload=["refs"],
+            with_vectors=False
+        )
+        for record in records:
+            points[record.id] = record.payload.get("refs", [])
+        if offset is None:
+            return points
+
+def set_point_refs(collection_name: str, refs_by_point: Dict[int, List[str]]):
+    """
+    Overwrite the refs of existing points, deleting points left without any.
+    
+    Args:
+        collection_name: The collection holding the points.
+        refs_by_point: The new refs for each point ID.
+    """
+    # Group points by their new ref list so each group is a single request
+    groups: Dict[Tuple[str, ...], List[int]] = {}
+    for point_id, refs in refs_by_point.items():
+        groups.setdefault(tuple(sorted(set(refs))), []).append(point_id)
+    
+    for refs, point_ids in groups.items():
+        if refs:
+            qdrant_client.set_payload(
+                collection_name=collection_name,
+                payload={"refs": list(refs)},
+                points=point_ids
+            )
+        else:
+            qdrant_client.delete(
+                collection_name=collection_name,
+                points_selector=models.PointIdsList(points=point_ids)
             )
+
+def store_ref_points(collection_name: str, ref: str, point_ids: List[int],
+                     new_points: List[models.PointStruct]) -> int:
+    """
+    Make a ref's manifest in a collection exactly the given point IDs.
+    
+    New points are inserted, existing points shared with other refs only get
+    the ref added to their "refs" payload, and points the ref no longer uses
+    lose it (and are deleted once no ref uses them).
+    
+    Args:
+        collection_name: The collection holding the points.
+        ref: The ref being stored.
+        point_ids: Every point ID in the ref.
+        new_points: Points that may not be stored yet, with vectors.
+        
+    Returns:
+        int: Number of points inserted.
+    """
+    existing = get_point_refs(collection_name, point_ids)
+    
+    inserted = 0
+    batch = []
+    for point in new_points:
+        if point.id in existing:
+            continue
+        point.payload["refs"] = [ref]
+        existing[point.id] = [ref]
+        batch.append(point)
+        inserted += 1
+        if len(batch) == 100:
+            qdrant_client.upsert(collection_name=collection_name, points=batch)
+            batch = []
+    if batch:
+        qdrant_client.upsert(collection_name=collection_name, points=batch)
+    
+    wanted = set(point_ids)
+    updates = {
+        point_id: refs + [ref]
+        for point_id, refs in existing.items()
+        if ref not in refs
+    }
+    updates.update({
+        point_id: [r for r in refs if r != ref]
+        for point_id, refs in get_ref_points(collection_name, ref).items()
+        if point_id not in wanted
+    })
+    set_point_refs(collection_name, updates)
+    
+    return inserted
+
+def find_stored_chunks(repo_url: str, point_ids: List[int]) -> Dict[int, List[str]]:
+    """
+    Find which chunks are already stored, so they don't need to be embedded again.
+    
+    Args:
+        repo_url: The repository URL.
+        point_ids: Content-addressed chunk IDs (see chunk_point_id).
+        
+    Returns:
+        Dict[int, List[str]]: The refs of every chunk that is already stored.
+    """
+    if not qdrant_client:
+        initialize_vector_db()
+    
+    collection_name = get_collection_name(repo_url)
+    if not collection_exists(collection_name):
+        return {}
+    return get_point_refs(collection_name, point_ids)
+
+def get_chunk_embeddings(repo_url: str, point_ids: List[int]) -> Dict[int, List[float]]:
+    """Load the stored vectors of chunks, keyed by point ID."""
+    if not qdrant_client:
+        initialize_vector_db()
+    
+    vectors = {}
+    batch_size = 1000
+    for i in range(0, len(point_ids), batch_size):
+        records = qdrant_client.retrieve(
+            collection_name=get_collection_name(repo_url),
+            ids=point_ids[i:i+batch_size],
+            with_payload=False,
+            with_vectors=True
         )
+        for record in records:
+            vectors[record.id] = record.vector
+    return vectors
+
+def store_embeddings(repo_url: str, embeddings: List[Dict[str, Any]], ref: str = DEFAULT_REF) -> int:
+    """
+    Store embeddings in the vector database.
+    
+    Chunks are content-addressed, so a chunk shared by several refs is
+    stored once. Items without an "embedding" must be chunks that are
+    already stored (see find_stored_chunks); they are only added to the
+    ref, and are left out of it if they turn out not to be stored.
+    
+    Args:
+        repo_url: The repository URL.
+        embeddings: List of embeddings with metadata.
+        ref: The branch, tag or commit the chunks belong to.
+        
+    Returns:
+        int: Number of chunks that were newly stored.
+    """
+    if not qdrant_client:
+        initialize_vector_db()
+    
+    collection_name = get_collection_name(repo_url)
+    
+    # Create collection if it doesn't exist
+    if not collection_exists(collection_name):
+        create_collection(collection_name, INDEXED_PAYLOAD_FIELDS)
     
     # Prepare points for insertion
+    point_ids = []
     points = []
-    for idx, item in enumerate(embeddings):
+    for item in embeddings:
+        point_id = item.get("point_id")
+        if point_id is None:
+            point_id = chunk_point_id(item["path"], item["content"])
+        point_ids.append(point_id)
+        if not item.get("embedding"):
+            continue
+        
+        extension = item.get("extension") or os.path.splitext(item["path"])[1].lower()
         points.append(
             models.PointStruct(
-                id=idx,
+                id=point_id,
                 vector=item["embedding"],
                 payload={
                     "repo_url": repo_url,
-                    "path": item["path"],
                     "content": item["content"],
-                    "chunk_id": item.get("chunk_id", 0)
+                    "chunk_id": item.get("chunk_id", 0),
+                    "extension": extension,
+                    "language": item.get("language", "text"),
+                    **get_path_payload(item["path"])
                 }
             )
         )
     
-    # Insert in batches if needed
-    batch_size = 100
-    for i in range(0, len(points), batch_size):
-        batch = points[i:i+batch_size]
-        qdrant_client.upsert(
-            collection_name=collection_name,
-            points=batch
+    return store_ref_points(collection_name, ref, point_ids, points)
+
+def store_summaries(repo_url: str, summaries: List[Dict[str, Any]], ref: str = DEFAULT_REF):
+    """
+    Store file-level and directory-level vectors for hierarchical search.
+    
+    Summaries are content-addressed by their path and the chunks they were
+    built from, so unchanged files and directories are shared between refs.
+    
+    Args:
+        repo_url: The repository URL.
+        summaries: Summaries produced by hierarchy.build_summaries.
+        ref: The branch, tag or commit the summaries belong to.
+    """
+    if not qdrant_client:
+        initialize_vector_db()
+    
+    collection_name = get_summary_collection_name(repo_url)
+    if not collection_exists(collection_name):
+        create_collection(collection_name, INDEXED_PAYLOAD_FIELDS + ["level"])
+    
+    point_ids = []
+    points = []
+    for item in summaries:
+        if item["level"] == "file":
+            payload = {
+                "extension": item.get("extension"),
+                "language": item.get("language", "text"),
+                **get_path_payload(item["path"])
+            }
+        else:
+            # A directory point matches directory and path-prefix filters on itself
+            parts = item["path"].split("/") if item["path"] else []
+            payload = {
+                "path": item["path"],
+                "directory": item["path"],
+                "dirs": ["/".join(parts[:i + 1]) for i in range(len(parts))]
+            }
+        
+        point_id = chunk_point_id(
+            item["level"], item["path"], *(str(i) for i in sorted(item.get("point_ids", [])))
         )
+        point_ids.append(point_id)
+        points.append(
+            models.PointStruct(
+                id=point_id,
+                vector=item["embedding"],
+                payload={
+                    "repo_url": repo_url,
+                    "level": item["level"],
+                    "chunk_count": item["chunk_count"],
+                    **payload
+                }
+            )
+        )
+    
+    store_ref_points(collection_name, ref, point_ids, points)
+
+def delete_summaries(repo_url: str, ref: str = DEFAULT_REF):
+    """Remove a ref's file and directory vectors, if it has any."""
+    if not qdrant_client:
+        initialize_vector_db()
+    
+    collection_name = get_summary_collection_name(repo_url)
+    if collection_exists(collection_name):
+        remove_ref_points(collection_name, ref)
+
+def remove_ref_points(collection_name: str, ref: str) -> int:
+    """
+    Remove a ref from every point in a collection that has it.
+    
+    Returns:
+        int: Number of points that belonged to the ref.
+    """
+    points = get_ref_points(collection_name, ref)
+    set_point_refs(collection_name, {
+        point_id: [r for r in refs if r != ref]
+        for point_id, refs in points.items()
+    })
+    return len(points)
+
+def delete_ref(repo_url: str, ref: str) -> bool:
+    """
+    Remove a ref from a repository's index.
+    
+    Chunks and summaries shared with other refs are kept; the rest are deleted.
+    
+    Args:
+        repo_url: The repository URL.
+        ref: The ref to remove.
+        
+    Returns:
+        bool: True if any points or metadata belonged to the ref.
+    """
+    if not qdrant_client:
+        initialize_vector_db()
+    
+    removed = 0
+    for collection_name in (get_collection_name(repo_url), get_summary_collection_name(repo_url)):
+        if collection_exists(collection_name):
+            removed += remove_ref_points(collection_name, ref)
+    
+    had_metadata = delete_ref_metadata(repo_url, ref)
+    return removed > 0 or had_metadata
 
-def search_vector_db(repo_url: str, query_embedding: List[float], limit: int = 5) -> List[Dict[str, Any]]:
+def prune_refs(repo_url: str, keep_last: Optional[int] = None, max_age_days: Optional[float] = None,
+               protect: Optional[List[str]] = None) -> List[str]:
+    """
+    Apply a retention policy to a repository's refs.
+    
+    Args:
+        repo_url: The repository URL.
+        keep_last: Keep only this many most recently indexed refs, besides
+            the protected ones.
+        max_age_days: Remove refs indexed longer ago than this.
+        protect: Refs that are never removed; defaults to [DEFAULT_REF].
+        
+    Returns:
+        List[str]: The refs that were removed.
+    """
+    protect = set(protect if protect is not None else [DEFAULT_REF])
+    refs = get_index_metadata(repo_url)["refs"]
+    
+    # Newest first, so keep_last counts from the most recent indexing run
+    candidates = sorted(
+        (ref for ref in refs if ref not in protect),
+        key=lambda ref: refs[ref].get("indexed_at", 0),
+        reverse=True
+    )
+    
+    to_remove = set()
+    if keep_last is not None:
+        to_remove.update(candidates[keep_last:])
+    if max_age_days:
+        cutoff = time.time() - max_age_days * 86400
+        to_remove.update(ref for ref in candidates if refs[ref].get("indexed_at", 0) < cutoff)
+    
+    removed = [ref for ref in candidates if ref in to_remove]
+    for ref in removed:
+        delete_ref(repo_url, ref)
+    return removed
+
+def apply_retention(repo_url: str) -> List[str]:
+    """Prune a repository's refs with the retention configured in the environment."""
+    if not REF_RETENTION_KEEP_LAST and not REF_RETENTION_MAX_AGE_DAYS:
+        return []
+    return prune_refs(
+        repo_url,
+        keep_last=REF_RETENTION_KEEP_LAST or None,
+        max_age_days=REF_RETENTION_MAX_AGE_DAYS or None
+    )
+
+def search_vector_db(repo_url: str, query_embedding: List[float], limit: int = 5,
+                     filters: Optional[Dict[str, Any]] = None, hierarchical: bool = False,
+                     top_files: int = DEFAULT_TOP_FILES,
+                     top_directories: Optional[int] = None,
+                     ref: str = DEFAULT_REF) -> List[Dict[str, Any]]:
     """
     Search the vector database for similar contents.
     
@@ -87,31 +791,265 @@ def search_vector_db(repo_url: str, query_embedding: List[float], limit: int = 5
         repo_url: The repository URL.
         query_embedding: The query embedding vector.
         limit: Maximum number of results to return.
+        filters: Optional path, extension, language and directory filters
+            (see build_search_filter).
+        hierarchical: Pick the top files first and search chunks only within
+            them (see search_vector_db_batch).
+        top_files: Number of files picked by a hierarchical search.
+        top_directories: If set, a hierarchical search first narrows the
+            files to this many top directories.
+        ref: The indexed branch, tag or commit to search.
         
     Returns:
         List[Dict[str, Any]]: List of search results with content and metadata.
     """
+    return search_vector_db_batch(
+        repo_url, [query_embedding], limit, filters,
+        hierarchical=hierarchical, top_files=top_files, top_directories=top_directories, ref=ref
+    )[0]
+
+def search_vector_db_batch(repo_url: str, query_embeddings: List[List[float]], limit: int = 5,
+                           filters: Optional[Dict[str, Any]] = None, hierarchical: bool = False,
+                           top_files: int = DEFAULT_TOP_FILES,
+                           top_directories: Optional[int] = None,
+                           ref: str = DEFAULT_REF) -> List[List[Dict[str, Any]]]:
+    """
+    Search the vector database for several queries in a single request.
+    
+    A hierarchical search runs in stages over the summary collection: the
+    top directories (optional), then the top files within them, and finally
+    the chunks of those files only. Repositories indexed without summaries
+    fall back to a flat search over every chunk.
+    
+    Args:
+        repo_url: The repository URL.
+        query_embeddings: The query embedding vectors.
+        limit: Maximum number of results to return per query.
+        filters: Optional filters applied to every query (see build_search_filter).
+        hierarchical: Use the staged search when summaries are available.
+        top_files: Number of files picked per query by the file stage.
+        top_directories: Number of directories picked per query before the
+            file stage, or None to search all files.
+        ref: The indexed branch, tag or commit to search.
+        
+    Returns:
+        List[List[Dict[str, Any]]]: Search results for each query, in order.
+        Queries without an embedding get an empty result list.
+    """
     if not qdrant_client:
         initialize_vector_db()
         
     collection_name = get_collection_name(repo_url)
+    query_filter, post_filter = build_search_filter(filters)
+    query_filter = with_conditions(query_filter, ref_condition(ref))
+    
+    # Queries whose embedding failed can't be searched
+    searchable = [idx for idx, embedding in enumerate(query_embeddings) if embedding]
+    vectors = [query_embeddings[idx] for idx in searchable]
+    results = [[] for _ in query_embeddings]
+    if not searchable:
+        return results
     
     try:
-        search_results = qdrant_client.search(
-            collection_name=collection_name,
-            query_vector=query_embedding,
-            limit=limit
+        chunk_filters = [query_filter] * len(vectors)
+        summary_collection = get_summary_collection_name(repo_url)
+        if hierarchical and collection_exists(summary_collection):
+            selected_files = select_files(
+                summary_collection, vectors, filters, top_files, top_directories, ref
+            )
+            chunk_filters = [
+                with_conditions(query_filter, models.FieldCondition(
+                    key="path",
+                    match=models.MatchAny(any=paths)
+                )) if paths else query_filter
+                for paths in selected_files
+            ]
+        
+        batch_results = search_filtered_batch(
+            collection_name, vectors, chunk_filters, limit, post_filter
         )
         
-        results = []
-        for result in search_results:
-            results.append({
-                "content": result.payload["content"],
-                "path": result.payload["path"],
-                "similarity": result.score
-            })
+        for idx, search_results in zip(searchable, batch_results):
+            results[idx] = format_search_results(search_results)
         
         return results
     except Exception as e:
         print(f"Error searching vector database: {e}")
-        return []
\ No newline at end of file
+        return results
+
+def select_files(summary_collection: str, vectors: List[List[float]], filters: Optional[Dict[str, Any]],
+                 top_files: int, top_directories: Optional[int] = None,
+                 ref: str = DEFAULT_REF) -> List[List[str]]:
+    """
+    Pick the most relevant files for each query from the summary collection.
+    
+    Args:
+        summary_collection: The repository's summary collection.
+        vectors: The query embedding vectors.
+        filters: The query filters; file points carry the same payload as chunks.
+        top_files: Number of files to pick per query.
+        top_directories: If set, only files anywhere below this many top
+            directories are considered.
+        ref: The indexed branch, tag or commit to search.
+        
+    Returns:
+        List[List[str]]: The selected file paths for each query.
+    """
+    file_filter, file_post_filter = build_search_filter(filters)
+    file_filter = with_conditions(file_filter, ref_condition(ref), models.FieldCondition(
+        key="level", match=models.MatchValue(value="file")
+    ))
+    file_filters = [file_filter] * len(vectors)
+    
+    if top_directories:
+        # Extension and language filters don't apply to directory points, and a
+        # prefix is only matched on its literal directories at this stage
+        directory_filters = {
+            key: value for key, value in (filters or {}).items()
+            if key in ("path_prefix", "directory")
+        }
+        directory_filter, _ = build_search_filter(directory_filters)
+        directory_filter = with_conditions(directory_filter, ref_condition(ref), models.FieldCondition(
+            key="level", match=models.MatchValue(value="directory")
+        ))
+        
+        directory_results = qdrant_client.search_batch(
+            collection_name=summary_collection,
+            requests=[
+                models.SearchRequest(
+                    vector=vector,
+                    filter=directory_filter,
+                    limit=top_directories,
+                    with_payload=True
+                )
+                for vector in vectors
+            ]
+        )
+        
+        file_filters = []
+        for search_results in directory_results:
+            directories = [r.payload["path"] for r in search_results]
+            
+            # Directory vectors cover whole subtrees, except the root one,
+            # which covers only the files at the repository root
+            subtrees = []
+            if any(directories):
+                subtrees.append(models.FieldCondition(
+                    key="dirs", match=models.MatchAny(any=[d for d in directories if d])
+                ))
+            if "" in directories:
+                subtrees.append(models.FieldCondition(
+                    key="directory", match=models.MatchValue(value="")
+                ))
+            file_filters.append(
+                with_conditions(file_filter, models.Filter(should=subtrees)) if subtrees else file_filter
+            )
+    
+    file_results = search_filtered_batch(
+        summary_collection, vectors, file_filters, top_files, file_post_filter
+    )
+    
+    return [[r.payload["path"] for r in search_results] for search_results in file_results]
+
+def search_filtered_batch(collection_name: str, vectors: List[List[float]],
+                          query_filters: List[Optional[models.Filter]], limit: int,
+                          post_filter: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[List[models.ScoredPoint]]:
+    """
+    Run a batch search, finishing an optional post-filter in Python.
+    
+    Without a post-filter this is a single Qdrant batch search. With one,
+    the paths passing it are resolved first (see resolve_path_filter), so
+    the batch search still runs once and returns only matching points.
+    
+    Args:
+        collection_name: The collection to search.
+        vectors: The query embedding vectors.
+        query_filters: The Qdrant filter for each query.
+        limit: Maximum number of results per query.
+        post_filter: Optional payload predicate results must satisfy.
+        
+    Returns:
+        List[List[models.ScoredPoint]]: The results for each query, in order.
+    """
+    searches = list(zip(vectors, query_filters))
+    if post_filter:
+        # Queries usually share a filter, so each distinct one is resolved once
+        resolved: Dict[str, Optional[models.Filter]] = {}
+        for query_filter in query_filters:
+            key = repr(query_filter)
+            if key not in resolved:
+                resolved[key] = resolve_path_filter(collection_name, query_filter, post_filter)
+        searches = [(vector, resolved[repr(query_filter)]) for vector, query_filter in searches]
+    
+    # A resolved filter of None means no path passed the post-filter
+    requests = [
+        models.SearchRequest(vector=vector, filter=query_filter, limit=limit, with_payload=True)
+        for vector, query_filter in searches
+        if query_filter is not None or not post_filter
+    ]
+    batch_results = iter(qdrant_client.search_batch(
+        collection_name=collection_name,
+        requests=requests
+    ) if requests else [])
+    
+    return [
+        next(batch_results) if query_filter is not None or not post_filter else []
+        for _, query_filter in searches
+    ]
+
+def resolve_path_filter(collection_name: str, query_filter: Optional[models.Filter],
+                        post_filter: Callable[[Dict[str, Any]], bool]) -> Optional[models.Filter]:
+    """
+    Replace a path post-filter with an indexed condition on the matching paths.
+    
+    The candidates left by the Qdrant filter are scrolled once, reading only
+    their paths, so the cost is linear in the narrowed candidates rather
+    than growing with every page a search has to skip.
+    
+    Args:
+        collection_name: The collection to search.
+        query_filter: The Qdrant filter narrowing the candidates.
+        post_filter: Payload predicate reading only "path".
+        
+    Returns:
+        Optional[models.Filter]: The filter restricted to the matching
+        paths, or None if no path matches.
+    """
+    seen = set()
+    paths = []
+    offset = None
+    while True:
+        records, offset = qdrant_client.scroll(
+            collection_name=collection_name,
+            scroll_filter=query_filter,
+            limit=1000,
+            offset=offset,
+            with_payload=["path"],
+            with_vectors=False
+        )
+        for record in records:
+            path = record.payload.get("path")
+            if path is not None and path not in seen:
+                seen.add(path)
+                if post_filter(record.payload):
+                    paths.append(path)
+        if offset is None:
+            break
+    
+    if not paths:
+        return None
+    return with_conditions(query_filter, models.FieldCondition(
+        key="path", match=models.MatchAny(any=paths)
+    ))
+
+def format_search_results(search_results: List[models.ScoredPoint]) -> List[Dict[str, Any]]:
+    """Convert scored points to result dicts."""
+    results = []
+    for result in search_results:
+        results.append({
+            "content": result.payload["content"],
+            "path": result.payload["path"],
+            "similarity": result.score
+        })
+    
+    return results
\ No newline at end of file
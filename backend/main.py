@@ -1,16 +1,42 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+import asyncio
+import json
 import uuid
 import os
+import tempfile
+import time
 from typing import Dict, List, Optional, Any
 
-from app.repository import clone_repository
-from app.processor import process_repository
-from app.embeddings import get_embeddings, initialize_embedding_model
-from app.vector_db import initialize_vector_db, search_vector_db, store_embeddings
+from app.repository import clone_repository, get_commit_sha
+from app.processor import process_repository, CHUNKER_VERSION
+from app.embeddings import EMBEDDING_BATCH_SIZE, EMBEDDING_MODEL, get_embeddings, get_embeddings_batch, initialize_embedding_model
+from app.vector_db import (
+    DEFAULT_REF,
+    DEFAULT_TOP_FILES,
+    apply_retention,
+    chunk_point_id,
+    delete_ref,
+    delete_summaries,
+    find_stored_chunks,
+    get_chunk_embeddings,
+    get_index_metadata,
+    initialize_vector_db,
+    prune_refs,
+    search_vector_db,
+    search_vector_db_batch,
+    set_index_metadata,
+    set_ref_metadata,
+    store_embeddings,
+    store_summaries
+)
+from app.hierarchy import build_summaries
 from app.llm import generate_answer
 from app.tasks import TaskManager
+from app.classifier import summarize_skipped
+from app.snapshot import iter_snapshot, import_snapshot
 
 app = FastAPI(title="GitHub Repository RAG API")
 
@@ -34,15 +60,32 @@ task_manager = TaskManager()
 
 class IndexRepoRequest(BaseModel):
     repo_url: str
+    ref: Optional[str] = None
+    include: Optional[List[str]] = None
+    exclude: Optional[List[str]] = None
+    max_file_size: Optional[int] = Field(default=None, gt=0)
+    hierarchical: bool = False
 
 class IndexRepoResponse(BaseModel):
     task_id: str
     status: str
     message: str
 
+class QueryFilters(BaseModel):
+    path_prefix: Optional[str] = None
+    path_glob: Optional[str] = None
+    extensions: Optional[List[str]] = None
+    languages: Optional[List[str]] = None
+    directory: Optional[str] = None
+
 class QueryRequest(BaseModel):
     repo_url: str
     query: str
+    ref: Optional[str] = None
+    filters: Optional[QueryFilters] = None
+    hierarchical: bool = False
+    top_files: int = Field(default=DEFAULT_TOP_FILES, ge=1, le=100)
+    top_directories: Optional[int] = Field(default=None, ge=1, le=100)
 
 class Source(BaseModel):
     content: str
@@ -53,6 +96,29 @@ class QueryResponse(BaseModel):
     answer: str
     sources: List[Source]
 
+class BatchQueryRequest(BaseModel):
+    repo_url: str
+    queries: List[str] = Field(min_length=1, max_length=1000)
+    ref: Optional[str] = None
+    filters: Optional[QueryFilters] = None
+    hierarchical: bool = False
+    top_files: int = Field(default=DEFAULT_TOP_FILES, ge=1, le=100)
+    top_directories: Optional[int] = Field(default=None, ge=1, le=100)
+    max_concurrency: int = Field(default=8, ge=1, le=32)
+
+class PruneRefsRequest(BaseModel):
+    repo_url: str
+    keep_last: Optional[int] = Field(default=None, ge=0)
+    max_age_days: Optional[float] = Field(default=None, gt=0)
+    protect: Optional[List[str]] = None
+
+class BatchQueryResult(BaseModel):
+    index: int
+    query: str
+    answer: Optional[str] = None
+    sources: List[Source] = []
+    error: Optional[str] = None
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize necessary components on startup."""
@@ -64,9 +130,12 @@ async def index_repo(request: IndexRepoRequest, background_tasks: BackgroundTask
     """Start indexing a GitHub repository."""
     repo_url = request.repo_url
     task_id = str(uuid.uuid4())
+    options = request.model_dump(include={"include", "exclude", "max_file_size"}, exclude_none=True)
     
     task_manager.create_task(task_id, repo_url)
-    background_tasks.add_task(process_repository_task, task_id, repo_url)
+    background_tasks.add_task(
+        process_repository_task, task_id, repo_url, options, request.hierarchical, request.ref
+    )
     
     return IndexRepoResponse(
         task_id=task_id,
@@ -85,7 +154,8 @@ async def get_indexing_status(task_id: str):
         "status": task["status"],
         "progress": task["progress"],
         "message": task["message"],
-        "error": task.get("error")
+        "error": task.get("error"),
+        "skipped": summarize_skipped(task["skipped_files"]) if task.get("skipped_files") is not None else None
     }
 
 @app.post("/query", response_model=QueryResponse)
@@ -98,12 +168,21 @@ async def query_repository(request: QueryRequest):
     """
     repo_url = request.repo_url
     query = request.query
+    filters = request.filters.model_dump(exclude_none=True) if request.filters else None
     
     # Generate embeddings for the query
     query_embedding = get_embeddings(query)
     
-    # Search vector database
-    search_results = search_vector_db(repo_url, query_embedding)
+    # Search vector database, narrowed by any path/language filters
+    search_results = search_vector_db(
+        repo_url,
+        query_embedding,
+        filters=filters,
+        hierarchical=request.hierarchical,
+        top_files=request.top_files,
+        top_directories=request.top_directories,
+        ref=request.ref or DEFAULT_REF
+    )
     
     if not search_results:
         raise HTTPException(status_code=404, detail="No relevant information found")
@@ -126,7 +205,151 @@ async def query_repository(request: QueryRequest):
         sources=sources
     )
 
-async def process_repository_task(task_id: str, repo_url: str):
+@app.post("/query/batch")
+async def query_repository_batch(request: BatchQueryRequest):
+    """
+    Answer many questions about an indexed repository in one request.
+    
+    All questions are embedded in batched requests and searched with a single
+    Qdrant batch search; answers are generated with bounded concurrency and
+    streamed back as newline-delimited JSON in completion order. Each line
+    carries the index of its question in the request.
+    """
+    repo_url = request.repo_url
+    queries = request.queries
+    filters = request.filters.model_dump(exclude_none=True) if request.filters else None
+    
+    async def answer_query(index: int, query: str, search_results: List[Dict[str, Any]],
+                           semaphore: asyncio.Semaphore) -> BatchQueryResult:
+        """Generate the answer for a single question of the batch."""
+        if not search_results:
+            return BatchQueryResult(index=index, query=query, error="No relevant information found")
+        
+        async with semaphore:
+            answer = await asyncio.to_thread(generate_answer, query, search_results)
+        
+        return BatchQueryResult(
+            index=index,
+            query=query,
+            answer=answer,
+            sources=[
+                Source(
+                    content=result["content"],
+                    path=result["path"],
+                    similarity=result["similarity"]
+                )
+                for result in search_results
+            ]
+        )
+    
+    async def stream_results():
+        # Embed and search every question up front; both are batched calls
+        query_embeddings = await asyncio.to_thread(get_embeddings_batch, queries)
+        all_results = await asyncio.to_thread(
+            search_vector_db_batch,
+            repo_url,
+            query_embeddings,
+            filters=filters,
+            hierarchical=request.hierarchical,
+            top_files=request.top_files,
+            top_directories=request.top_directories,
+            ref=request.ref or DEFAULT_REF
+        )
+        
+        semaphore = asyncio.Semaphore(request.max_concurrency)
+        tasks = [
+            asyncio.create_task(answer_query(index, query, search_results, semaphore))
+            for index, (query, search_results) in enumerate(zip(queries, all_results))
+        ]
+        
+        try:
+            for task in asyncio.as_completed(tasks):
+                result = await task
+                yield json.dumps(result.model_dump()) + "\n"
+        finally:
+            # Stop outstanding LLM calls if the client goes away
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.get("/export-repo")
+async def export_repo(repo_url: str):
+    """
+    Stream a repository's index as a snapshot file.
+    
+    The snapshot can be loaded on another node with /import-repo or
+    `python -m app.snapshot import`, without cloning or re-embedding.
+    """
+    pieces = iter_snapshot(repo_url)
+    try:
+        # Start the generator so a missing index is reported before streaming
+        first_piece = next(pieces)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    
+    def stream_snapshot():
+        yield first_piece
+        yield from pieces
+    
+    return StreamingResponse(
+        stream_snapshot(),
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": "attachment; filename=index.gitrag"}
+    )
+
+@app.post("/import-repo")
+async def import_repo(request: Request, repo_url: Optional[str] = None):
+    """
+    Load a snapshot produced by /export-repo from the raw request body.
+    
+    The repository becomes queryable as soon as the points are loaded;
+    no embedding requests are made.
+    """
+    # Spool the upload to disk so large snapshots aren't held in memory
+    with tempfile.TemporaryFile() as spool:
+        async for piece in request.stream():
+            spool.write(piece)
+        spool.seek(0)
+        
+        try:
+            result = await asyncio.to_thread(import_snapshot, spool, repo_url)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "repo_url": result["repo_url"],
+        "refs": result["refs"],
+        "embedding_model": result["embedding_model"],
+        "chunker_version": result["chunker_version"],
+        "points_loaded": result["points_loaded"]
+    }
+
+@app.get("/refs")
+async def list_refs(repo_url: str):
+    """List the indexed refs of a repository with their commit SHAs."""
+    return get_index_metadata(repo_url).get("refs", {})
+
+@app.delete("/refs")
+async def remove_ref(repo_url: str, ref: str):
+    """Remove an indexed ref; chunks still used by other refs are kept."""
+    if not delete_ref(repo_url, ref):
+        raise HTTPException(status_code=404, detail="Ref not found")
+    return {"removed": [ref]}
+
+@app.post("/refs/prune")
+async def prune_repo_refs(request: PruneRefsRequest):
+    """Apply a retention policy to a repository's indexed refs."""
+    removed = prune_refs(
+        request.repo_url,
+        keep_last=request.keep_last,
+        max_age_days=request.max_age_days,
+        protect=request.protect
+    )
+    return {"removed": removed}
+
+async def process_repository_task(task_id: str, repo_url: str, options: Optional[Dict[str, Any]] = None,
+                                  hierarchical: bool = False, ref: Optional[str] = None):
     """Background task to process a repository."""
     try:
         task_manager.update_task(
@@ -137,7 +360,9 @@ async def process_repository_task(task_id: str, repo_url: str):
         )
         
         # Clone repository
-        repo_path = clone_repository(repo_url)
+        repo_path = clone_repository(repo_url, ref)
+        commit_sha = get_commit_sha(repo_path)
+        ref = ref or DEFAULT_REF
         task_manager.update_task(
             task_id, 
             progress=10, 
@@ -154,35 +379,108 @@ async def process_repository_task(task_id: str, repo_url: str):
                 message=f"Processing files: {progress}% complete"
             )
         
-        # Process repository files with progress tracking
-        files = process_repository(repo_path, progress_callback=update_progress)
+        # Process repository files with progress tracking, skipping generated/vendored content
+        skipped_files = []
+        files = process_repository(
+            repo_path,
+            progress_callback=update_progress,
+            options=options,
+            skipped_files=skipped_files
+        )
+        task_manager.update_task(task_id, skipped_files=skipped_files)
+        
+        # Chunks are content-addressed, so only chunks no other ref has stored need embedding
+        for file in files:
+            file["point_id"] = chunk_point_id(file["path"], file["content"])
+        stored = find_stored_chunks(repo_url, [file["point_id"] for file in files])
         
         # Generate embeddings
         embeddings = []
-        total_files = len(files)
-        for i, file in enumerate(files):
-            file_embedding = get_embeddings(file["content"])
+        embedded = {}
+        to_embed = {}
+        for file in files:
+            if file["point_id"] not in stored:
+                to_embed.setdefault(file["point_id"], file["content"])
+        point_ids = list(to_embed)
+        total_files = len(point_ids)
+        for i in range(0, total_files, EMBEDDING_BATCH_SIZE):
+            batch = point_ids[i:i + EMBEDDING_BATCH_SIZE]
+            vectors = get_embeddings_batch([to_embed[point_id] for point_id in batch])
+            embedded.update(zip(batch, vectors))
+            
+            # Scale progress to remaining 50-90 range
+            progress = 50 + int((len(embedded) / total_files) * 40)  # 50-90%
+            task_manager.update_task(
+                task_id,
+                progress=progress,
+                message=f"Generating embeddings: {int((len(embedded)/total_files) * 100)}% complete"
+            )
+        
+        # A chunk whose embedding failed is left out of the ref and reported, not counted as stored
+        failed = {point_id for point_id, embedding in embedded.items() if not embedding}
+        if failed and failed == {file["point_id"] for file in files}:
+            raise RuntimeError(f"Failed to generate embeddings for all {len(failed)} chunks")
+        for file in files:
+            if file["point_id"] in failed:
+                skipped_files.append({
+                    "path": file["path"],
+                    "reason": "embedding failed",
+                    "chunk_id": file["chunk_id"]
+                })
+                continue
+            
             embeddings.append({
+                "point_id": file["point_id"],
                 "path": file["path"],
                 "content": file["content"],
-                "embedding": file_embedding
+                "chunk_id": file["chunk_id"],
+                "extension": file["extension"],
+                "language": file["language"],
+                "embedding": embedded.get(file["point_id"])
             })
-            
-            # Scale progress to remaining 50-90 range
-            progress = 50 + int((i / total_files) * 40)  # 50-90%
+        
+        # Store embeddings in vector database under this ref
+        store_embeddings(repo_url, embeddings, ref=ref)
+        
+        # Build file and directory vectors from the chunk embeddings for two-stage search
+        if hierarchical:
             task_manager.update_task(
                 task_id,
-                progress=progress,
-                message=f"Generating embeddings: {int((i/total_files) * 100)}% complete"
+                progress=95,
+                message="Building file and directory summaries"
             )
+            reused = get_chunk_embeddings(repo_url, [
+                item["point_id"] for item in embeddings if item["point_id"] in stored
+            ])
+            for item in embeddings:
+                if item["point_id"] in stored:
+                    item["embedding"] = reused.get(item["point_id"])
+            store_summaries(repo_url, build_summaries(embeddings), ref=ref)
+        else:
+            # Don't let summaries from an earlier index select stale files
+            delete_summaries(repo_url, ref)
         
-        # Store embeddings in vector database
-        store_embeddings(repo_url, embeddings)
+        set_index_metadata(
+            repo_url,
+            embedding_model=EMBEDDING_MODEL,
+            chunker_version=CHUNKER_VERSION
+        )
+        set_ref_metadata(repo_url, ref, commit_sha=commit_sha, indexed_at=time.time())
+        pruned = apply_retention(repo_url)
+        
+        message = (
+            f"Repository indexed successfully at {ref} "
+            f"({len(embedded) - len(failed)} chunks embedded, {len(stored)} reused)"
+        )
+        if failed:
+            message += f"; {len(failed)} chunks failed to embed"
+        if pruned:
+            message += f"; pruned refs: {', '.join(pruned)}"
         task_manager.update_task(
             task_id,
             progress=100,
             status="completed",
-            message="Repository indexed successfully"
+            message=message
         )
         
     except Exception as e:
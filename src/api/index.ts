@@ -11,6 +11,7 @@ export const api = axios.create({
 
 export interface IndexRepoRequest {
   repo_url: string;
+  ref?: string;
 }
 
 export interface IndexRepoResponse {
@@ -26,9 +27,19 @@ export interface IndexingStatusResponse {
   error?: string;
 }
 
+export interface QueryFilters {
+  path_prefix?: string;
+  path_glob?: string;
+  extensions?: string[];
+  languages?: string[];
+  directory?: string;
+}
+
 export interface QueryRequest {
   repo_url: string;
   query: string;
+  ref?: string;
+  filters?: QueryFilters;
 }
 
 export interface QueryResponse {